@@ -0,0 +1,19 @@
+# agents/_tools.py
+"""
+Single place that probes for ADK's FunctionTool.
+Agents call wrap(...) instead of repeating the try/except.
+"""
+from typing import Any, Callable, List
+
+try:
+    from google.adk.tools import FunctionTool as _FT
+
+    HAS_FT = True
+except Exception:
+    _FT = None
+    HAS_FT = False
+
+
+def wrap(*fns: Callable[..., Any]) -> List[Any]:
+    """Wrap plain functions as ADK tools (empty list if FunctionTool is unavailable)."""
+    return [_FT(f) for f in fns] if HAS_FT else []
@@ -1,35 +1,46 @@
+from functools import lru_cache
+
 from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
 from google.genai import types
 
-from rag.tool import rag_search_2pass, rag_get_page
+from rag.tool import rag_search_race, rag_get_page
 
-from prompts.research_prompt import agent_instruction, DEFAULT_CONFIG
+from prompts.research_prompt import agent_instruction, DEFAULT_CONFIG, PromptConfig
 
-try:
-    from google.adk.tools import FunctionTool
-except Exception:
-    FunctionTool = None
+from agents._tools import wrap
 
 
+# Delays ~0.5, 1, 2, 4s (+ up to 0.5s jitter each, capped at 8s): under 10s total
 retry_config = types.HttpRetryOptions(
     attempts=5,
-    exp_base=7,
-    initial_delay=1,
+    exp_base=2,
+    initial_delay=0.5,
+    max_delay=8,
+    jitter=0.5,
     http_status_codes=[429, 500, 503, 504],
 )
 
-tools = []
-if FunctionTool:
-    tools = [
-        FunctionTool(rag_search_2pass),
-        FunctionTool(rag_get_page),
-    ]
-
-research_agent = LlmAgent(
-    name="research_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
-    description="RAG-only research assistant backed by a local vector store.",
-    instruction=agent_instruction(DEFAULT_CONFIG),
-    tools=tools,
-)
+_TOOLS = wrap(rag_search_race, rag_get_page)
+
+
+@lru_cache(maxsize=None)
+def build_research_agent(cfg: PromptConfig = DEFAULT_CONFIG) -> LlmAgent:
+    """
+    Build (once per prompt config) the RAG research agent.
+    """
+    return LlmAgent(
+        name="research_agent",
+        model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+        description="RAG-only research assistant backed by a local vector store.",
+        instruction=agent_instruction(cfg),
+        tools=_TOOLS,
+    )
+
+
+def __getattr__(name: str):
+    # Keep `from agents.research_agent import research_agent` working,
+    # but only construct the agent when it is actually referenced.
+    if name == "research_agent":
+        return build_research_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,58 @@
 import asyncio
-import os
-from dotenv import load_dotenv
+import sys
+import threading
+from pathlib import Path
 
-load_dotenv()
+try:
+    import uvloop  # optional: faster event loop on Linux/macOS
+except ImportError:
+    uvloop = None
 
-from google.genai import types
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+_ENV_FILE = Path(__file__).resolve().parent / ".env"
+if _ENV_FILE.exists():
+    from dotenv import load_dotenv
 
-from agents.research_agent import research_agent
+    load_dotenv(_ENV_FILE)
 
 
-async def ainput(prompt: str) -> str:
-    return await asyncio.to_thread(input, prompt)
+EXIT_CMDS = frozenset({"exit", "quit", "Exit", "Quit", "EXIT", "QUIT"})
+
+
+def _in_daemon_thread(fn, *args) -> "asyncio.Future":
+    """
+    Run a blocking call on a daemon thread and return a future for its result.
+    Unlike asyncio.to_thread, interpreter exit never waits for it (a pending
+    stdin read or a half-finished agent build must not keep the CLI alive).
+    """
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+
+    def _settle(ok: bool, value):
+        if fut.done():  # cancelled meanwhile
+            return
+        if ok:
+            fut.set_result(value)
+        else:
+            fut.set_exception(value)
+
+    def _work():
+        try:
+            result = (True, fn(*args))
+        except BaseException as e:
+            result = (False, e)
+        try:
+            loop.call_soon_threadsafe(_settle, *result)
+        except RuntimeError:
+            pass  # loop already closed
+
+    threading.Thread(target=_work, daemon=True).start()
+    return fut
+
+
+async def _read_line() -> str:
+    # No prompt here: the next line may be read while an answer is still printing.
+    # Returns "" on EOF.
+    return await _in_daemon_thread(sys.stdin.readline)
 
 
 async def _graceful_shutdown():
@@ -26,50 +66,93 @@ async def _graceful_shutdown():
         pass
 
 
-async def main():
-    session_service = InMemorySessionService()
+async def _prepare_runner(app_name: str, user_id: str, session_id: str):
+    """
+    Import ADK, build the agent (loads the vector store) and create the session.
+    Runs while the user is typing the first question.
+    """
+    # Deferred: google.adk / google.genai and the agent are heavy imports;
+    # build them on a daemon thread so the prompt stays responsive and an
+    # immediate "exit" doesn't wait for the build to finish.
+    from runtime import get_runner, get_session_service
 
+    runner = await _in_daemon_thread(get_runner, "research", app_name)
+    await get_session_service().create_session(app_name=app_name, user_id=user_id, session_id=session_id)
+    return runner
+
+
+async def main():
     app_name = "pdf_cli"
     user_id = "local_user"
     session_id = "local_session"
 
-    await session_service.create_session(app_name=app_name, user_id=user_id, session_id=session_id)
+    print("Research Agent CLI. Type 'exit' to quit.\n")
 
-    runner = Runner(agent=research_agent, app_name=app_name, session_service=session_service)
+    init_task = asyncio.create_task(_prepare_runner(app_name, user_id, session_id))
+    runner = None
 
-    print("Research Agent CLI. Type 'exit' to quit.\n")
+    next_line = asyncio.create_task(_read_line())
 
     try:
         while True:
-            q = (await ainput("You: ")).strip()
-            if not q or q.lower() in {"exit", "quit"}:
+            if not next_line.done():
+                sys.stdout.write("You: ")
+                sys.stdout.flush()
+            q = (await next_line).strip()
+            if not q or q in EXIT_CMDS:
                 break
 
-            msg = types.Content(parts=[types.Part(text=q)])
+            if runner is None:
+                runner = await init_task
+                from google.genai import types  # already loaded by the agent import
 
-            final_text = None
+            # model_construct skips pydantic validation; the inputs are already plain text.
+            # A fresh Part per turn (not a mutated template) since the session keeps past messages.
+            msg = types.Content.model_construct(parts=[types.Part.model_construct(text=q)])
+
+            # Start reading the next question now so type-ahead during the answer is picked up
+            next_line = asyncio.create_task(_read_line())
+
+            # Print text as events arrive instead of buffering the final answer
+            got_any = False
             async for event in runner.run_async(
                 user_id=user_id,
                 session_id=session_id,
                 new_message=msg,
             ):
-                if event.is_final_response() and event.content and event.content.parts:
-                    final_text = "\n".join(
-                        p.text for p in event.content.parts if getattr(p, "text", None)
-                    )
-
-            print(f"\nAgent: {final_text or '(no response)'}\n")
+                if not (event.content and event.content.parts):
+                    continue
+                for p in event.content.parts:
+                    text = getattr(p, "text", None)
+                    if not text:
+                        continue
+                    if not got_any:
+                        sys.stdout.write("\nAgent: ")
+                        got_any = True
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+
+            if not got_any:
+                sys.stdout.write("\nAgent: (no response)")
+            sys.stdout.write("\n\n")
+            sys.stdout.flush()
 
     finally:
-        # IMPORTANT: attempt to close underlying network clients cleanly
-        try:
-            # Some ADK versions expose close/aclosedown indirectly; this is best-effort.
-            await session_service.aclose()  # if implemented
-        except Exception:
-            pass
+        if init_task.done() and not init_task.cancelled() and init_task.exception() is None:
+            # IMPORTANT: attempt to close underlying network clients cleanly
+            try:
+                from runtime import get_session_service
+
+                # Some ADK versions expose close/aclosedown indirectly; this is best-effort.
+                await get_session_service().aclose()  # if implemented
+            except Exception:
+                pass
 
         await _graceful_shutdown()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
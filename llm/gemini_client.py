@@ -1,17 +1,26 @@
 # llm/gemini_client.py
 import os
+import threading
 from google.genai import Client
 
+# Read once; callers load .env (load_dotenv) before importing this module
+_API_KEY = os.getenv("GOOGLE_API_KEY")
+
 _client = None
+_client_lock = threading.Lock()
 
 def _get_client() -> Client:
     global _client
-    if _client is None:
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise RuntimeError("GOOGLE_API_KEY not found. Set it in .env")
-        _client = Client(api_key=api_key)
-    return _client
+    # Fast path: already built, no lock needed
+    client = _client
+    if client is not None:
+        return client
+    with _client_lock:
+        if _client is None:
+            if not _API_KEY:
+                raise RuntimeError("GOOGLE_API_KEY not found. Set it in .env")
+            _client = Client(api_key=_API_KEY)
+        return _client
 
 def gemini_chat(prompt: str, model: str = "gemini-2.5-flash-lite") -> str:
     client = _get_client()
@@ -1,11 +1,26 @@
 # llm/openai_client.py
 import os
-from openai import OpenAI
+import threading
 
-_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_client = None
+_client_lock = threading.Lock()
+
+def _get_client():
+    global _client
+    client = _client
+    if client is not None:
+        return client
+    with _client_lock:
+        if _client is None:
+            # Deferred so importing this module doesn't load openai/httpx
+            from openai import OpenAI
+
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return _client
 
 def openai_chat(prompt: str, model: str = "gpt-4o-mini", temperature: float = 0.2) -> str:
-    resp = _client.chat.completions.create(
+    client = _get_client()
+    resp = client.chat.completions.create(
         model=model,
         temperature=temperature,
         messages=[{"role": "user", "content": prompt}],
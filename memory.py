@@ -1,11 +1,16 @@
 # memory.py
 from __future__ import annotations
 
+import heapq
+import sys
 import time
 from dataclasses import dataclass, field
 from typing import Deque, Dict, List, Optional, Set, Tuple
 from collections import deque
 
+# Flattens a message onto one line in a single pass
+_NL_TABLE = str.maketrans({"\n": " ", "\r": " ", "\t": " "})
+
 
 @dataclass
 class SessionState:
@@ -17,22 +22,39 @@ class SessionState:
     summary: str = ""
     # Recently used sources (paper.pdf p.X)
     recent_sources: Deque[str] = field(default_factory=lambda: deque(maxlen=8))
+    # Mirror of recent_sources for O(1) membership checks
+    _source_set: Set[str] = field(default_factory=set, init=False, repr=False)
+    # Cached build_context_block() output; rebuilt only after a mutation
+    _ctx_dirty: bool = field(default=True, init=False, repr=False)
+    _ctx_cache: str = field(default="", init=False, repr=False)
 
     def add_turn(self, user: str, assistant: str):
         self.last_seen = time.time()
         self.turns.append((user, assistant))
+        self._ctx_dirty = True
 
     def add_sources(self, sources: List[str]):
         self.last_seen = time.time()
         for s in sources:
-            if s and s not in self.recent_sources:
+            if not s:
+                continue
+            # Labels repeat across turns; interned copies hash/compare by identity
+            s = sys.intern(s)
+            if s not in self._source_set:
+                if len(self.recent_sources) == self.recent_sources.maxlen:
+                    self._source_set.discard(self.recent_sources[-1])
                 self.recent_sources.appendleft(s)
+                self._source_set.add(s)
+                self._ctx_dirty = True
 
     def build_context_block(self) -> str:
         """
         Small, stable memory block: summary + last 2 turns + recent sources.
         Keeps the prompt compact and avoids context blow-up.
         """
+        if not self._ctx_dirty:
+            return self._ctx_cache
+
         parts: List[str] = []
 
         if self.summary.strip():
@@ -50,7 +72,9 @@ class SessionState:
         if self.recent_sources:
             parts.append("Recently referenced sources:\n" + "\n".join(list(self.recent_sources)[:5]))
 
-        return "\n\n".join(parts).strip()
+        self._ctx_cache = "\n\n".join(parts).strip()
+        self._ctx_dirty = False
+        return self._ctx_cache
 
     def update_summary_heuristic(self):
         """
@@ -63,17 +87,25 @@ class SessionState:
             return
 
         # Keep ~500 chars summary max
-        combined = " | ".join(m.strip().replace("\n", " ") for m in user_msgs if m.strip())
-        combined = combined[:500]
+        msgs = [m.translate(_NL_TABLE).strip() for m in user_msgs if m and not m.isspace()]
+        combined = " | ".join(msgs)[:500]
 
         # Stable phrasing helps the model
         self.summary = combined
+        self._ctx_dirty = True
 
 
 class InMemoryChatStore:
+    # Cap on heap pops per get(); expired sessions beyond this are reaped on later calls
+    GC_MAX_POPS = 16
+
     def __init__(self, ttl_seconds: int = 6 * 60 * 60):
         self.ttl_seconds = ttl_seconds
         self._sessions: Dict[str, SessionState] = {}
+        # Min-heap of (deadline, session_id); stale entries are skipped lazily
+        self._heap: List[Tuple[float, str]] = []
+        # Latest deadline pushed per session (anything else in the heap is a tombstone)
+        self._deadline: Dict[str, float] = {}
 
     def get(self, session_id: str) -> SessionState:
         now = time.time()
@@ -83,12 +115,28 @@ class InMemoryChatStore:
             st = SessionState()
             self._sessions[session_id] = st
         st.last_seen = now
+        self._touch(session_id, now + self.ttl_seconds)
         return st
 
+    def _touch(self, session_id: str, deadline: float):
+        self._deadline[session_id] = deadline
+        heapq.heappush(self._heap, (deadline, session_id))
+        # Compact when tombstones dominate so the heap stays O(sessions)
+        if len(self._heap) > 2 * len(self._deadline) + 64:
+            self._heap = [(d, sid) for sid, d in self._deadline.items()]
+            heapq.heapify(self._heap)
+
     def _gc(self, now: float):
-        dead = []
-        for sid, st in self._sessions.items():
-            if now - st.last_seen > self.ttl_seconds:
-                dead.append(sid)
-        for sid in dead:
+        pops = 0
+        while self._heap and self._heap[0][0] < now and pops < self.GC_MAX_POPS:
+            deadline, sid = heapq.heappop(self._heap)
+            pops += 1
+            if self._deadline.get(sid) != deadline:
+                continue  # superseded by a later touch
+            st = self._sessions.get(sid)
+            if st is not None and now - st.last_seen <= self.ttl_seconds:
+                # last_seen was bumped outside get() (add_turn / add_sources)
+                self._touch(sid, st.last_seen + self.ttl_seconds)
+                continue
             self._sessions.pop(sid, None)
+            self._deadline.pop(sid, None)
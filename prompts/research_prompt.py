@@ -1,6 +1,9 @@
 # prompts/research_prompt.py
 from __future__ import annotations
+
+import sys
 from dataclasses import dataclass
+from functools import lru_cache
 
 
 @dataclass(frozen=True)
@@ -14,6 +17,7 @@ class PromptConfig:
 DEFAULT_CONFIG = PromptConfig()
 
 
+@lru_cache(maxsize=16)
 def agent_instruction(cfg: PromptConfig = DEFAULT_CONFIG) -> str:
     return f"""
 You are ResearchAgent, a deep knowledge assistant over a local corpus of indexed documents.
@@ -52,11 +56,10 @@ SOURCES USED RULES
 """.strip()
 
 
-def build_chat_prompt(user_q: str, evidence: str, cfg: PromptConfig = DEFAULT_CONFIG, context: str = "") -> str:
-    ctx = context.strip()
-    ctx_block = f"CONTEXT (from this chat session):\n{ctx}\n\n" if ctx else ""
-
-    return f"""You are a Research Assistant over a local document corpus.
+# Static part of the chat prompt (identical for every request).
+# Keep it first: Gemini 2.5 implicit caching and OpenAI prompt caching both
+# reuse a shared request *prefix*, so per-request text must come after it.
+_CHAT_HEADER = sys.intern("""You are a Research Assistant over a local document corpus.
 
 Rules:
 - Answer in depth and be explanatory.
@@ -65,13 +68,22 @@ Rules:
 - Use denominators when giving percentages.
 - If evidence includes tables/lists/numeric blocks, reconstruct them clearly and interpret them.
 
-{ctx_block}EVIDENCE (with source/page/chunk):
-{evidence}
+""")
 
-USER QUESTION:
-{user_q}
 
-After your answer, include:
+@lru_cache(maxsize=16)
+def _chat_footer(cfg: PromptConfig) -> str:
+    return sys.intern(f"""After your answer, include:
 What to look up next: ({cfg.followups_min}–{cfg.followups_max} bullets)
 Sources used: top {cfg.sources_min}–{cfg.sources_max} sources (paper + page + chunk) you relied on most.
-"""
+""")
+
+
+def build_chat_prompt(user_q: str, evidence: str, cfg: PromptConfig = DEFAULT_CONFIG, context: str = "") -> str:
+    ctx = context.strip()
+    ctx_block = f"CONTEXT (from this chat session):\n{ctx}\n\n" if ctx else ""
+
+    return (
+        f"{_CHAT_HEADER}{ctx_block}EVIDENCE (with source/page/chunk):\n{evidence}\n\n"
+        f"USER QUESTION:\n{user_q}\n\n{_chat_footer(cfg)}"
+    )
@@ -0,0 +1,74 @@
+# rag/embedder.py
+"""
+Embedding model loading shared by the indexer and the store.
+"""
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+from sentence_transformers import SentenceTransformer
+
+
+def pick_device() -> str:
+    """
+    Best available torch device: cuda > mps > cpu.
+    Override with RAG_DEVICE (e.g. RAG_DEVICE=cpu).
+    """
+    forced = os.getenv("RAG_DEVICE", "").strip()
+    if forced:
+        return forced
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    if torch.cuda.is_available():
+        return "cuda"
+    mps = getattr(torch.backends, "mps", None)
+    if mps is not None and mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def encode_batch_size(device: str) -> int:
+    # Accelerators amortize larger batches; CPU gains little past ~32
+    return 32 if device == "cpu" else 128
+
+
+# "torch" (default) or "onnx" (ONNX Runtime; needs sentence-transformers>=3.2 and
+# `pip install "sentence-transformers[onnx]"`, or [onnx-gpu] for CUDA)
+BACKENDS = ("torch", "onnx")
+
+
+def load_embedder(
+    model_name: str,
+    device: Optional[str] = None,
+    backend: str = "torch",
+    fp16: bool = False,
+    compile: bool = False,
+) -> SentenceTransformer:
+    """
+    fp16:    run the torch model in half precision on GPU/MPS (ignored on CPU).
+    compile: torch.compile the transformer (pays a one-off compile; worth it for bulk encoding).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+    device = device or pick_device()
+    if backend == "torch":
+        import torch
+
+        # Flush denormal floats to zero: avoids slow microcode paths on tiny activations (CPU only; no-op elsewhere)
+        torch.set_flush_denormal(True)
+        model = SentenceTransformer(model_name, device=device)
+        if fp16 and device != "cpu":
+            model.half()
+        if compile and device != "cpu" and hasattr(torch, "compile"):
+            # dynamic=True: chunk batches vary in sequence length
+            model[0].auto_model = torch.compile(model[0].auto_model, dynamic=True)
+        return model
+
+    model_kwargs = {}
+    if device == "cuda":
+        model_kwargs["provider"] = "CUDAExecutionProvider"
+    # Same tokenizer + mean-pool + normalize pipeline, with the transformer run by ONNX Runtime
+    return SentenceTransformer(model_name, device=device, backend=backend, model_kwargs=model_kwargs)
@@ -11,21 +11,34 @@ Supported:
 
 Outputs:
 - resources/.rag_store/index.faiss
-- resources/.rag_store/records.json
+- resources/.rag_store/records.json     (or records.jsonl / records.parquet, see --records)
 - resources/.rag_store/meta.json
+- resources/.rag_store/embeddings.<build>.f32  (raw float32 vectors, row i = records[i])
+- resources/.rag_store/cache.json      (per-file mtime/size/sha1 + row range, for incremental rebuilds)
+
+meta.json is written last and names the build; cache.json carries the same build
+id, so files left by an interrupted build are never mistaken for a complete one.
 
 Install:
-pip install faiss-cpu sentence-transformers numpy pypdf python-docx
+pip install faiss-cpu sentence-transformers numpy pypdf
 """
 
 from __future__ import annotations
 
 import csv
+import hashlib
 import json
+import math
+import os
+import secrets
 import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from xml.etree import ElementTree as ET
 
 import numpy as np
 
@@ -44,14 +57,44 @@ try:
 except Exception as e:
     raise RuntimeError("pypdf required for PDFs. Install with: pip install pypdf") from e
 
-try:
-    from docx import Document  # type: ignore
-except Exception as e:
-    raise RuntimeError("python-docx required. Install with: pip install python-docx") from e
+if not __package__:
+    # Running as `python rag/index.py`: make the repo root importable for `rag.*`
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rag.embedder import encode_batch_size, load_embedder, pick_device  # noqa: E402
+from rag.records import load_records, write_records  # noqa: E402
 
 
 SUPPORTED_EXTS = {".pdf", ".txt", ".md", ".docx", ".csv", ".json"}
 
+# From this many chunks on, build an IVF index (approximate; search visits
+# IVF_NPROBE clusters instead of every vector). Smaller corpora stay exact (flat).
+IVF_MIN_CHUNKS = 100_000
+IVF_NPROBE = 16
+
+# --ann hnsw: graph index (log-time search, no training). M links per node;
+# efSearch is the query-time candidate list (RAG_EF_SEARCH overrides it)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+ANN_KINDS = ("auto", "hnsw")
+
+# Vector encodings (--quant). "none" keeps exact fp32 vectors; "fp16" halves the
+# memory read per query with negligible recall loss; "sq8" stores int8
+# scalar-quantized vectors: 4x less memory read per query, small recall loss.
+QUANT_ENCODINGS = {"none": "Flat", "fp16": "SQfp16", "sq8": "SQ8"}
+
+# Chunks per encoder call when streaming vectors to embeddings.f32
+EMBED_CHUNK_ROWS = 1024
+
+# On CPU, from this many new chunks on, encode with a pool of worker processes
+# (one torch process saturates at a few threads; startup loads one model per worker)
+MULTI_PROCESS_MIN_CHUNKS = 4096
+
+# A PDF extracted on its own is split into page ranges across processes
+# once it has this many pages (pypdf is pure Python, so threads would not help)
+PDF_PARALLEL_MIN_PAGES = 64
+
 
 @dataclass
 class Block:
@@ -90,12 +133,16 @@ def discover_docs(root: Path) -> List[Path]:
 # Extractors (minimal)
 # -----------------------
 
-def extract_pdf(path: Path) -> List[Block]:
+def _extract_pdf_pages(path: Path, start: int, stop: int) -> List[Block]:
+    # Each worker opens its own reader; pypdf readers are not shareable across processes
+    return _pdf_page_blocks(PdfReader(str(path)), start, stop)
+
+
+def _pdf_page_blocks(reader: "PdfReader", start: int, stop: int) -> List[Block]:
     blocks: List[Block] = []
-    reader = PdfReader(str(path))
-    for i, page in enumerate(reader.pages):
+    for i in range(start, min(stop, len(reader.pages))):
         try:
-            t = _clean(page.extract_text() or "")
+            t = _clean(reader.pages[i].extract_text() or "")
         except Exception:
             t = ""
         if t:
@@ -103,22 +150,98 @@ def extract_pdf(path: Path) -> List[Block]:
     return blocks
 
 
-def extract_docx(path: Path) -> List[Block]:
-    doc = Document(str(path))
-    lines: List[str] = []
-    for p in doc.paragraphs:
-        t = _clean(p.text)
-        if t:
-            lines.append(t)
+def extract_pdf(path: Path, workers: int = 1) -> List[Block]:
+    """
+    Extract one block per non-empty page. With workers > 1 and a long PDF,
+    contiguous page ranges are extracted in parallel (order is preserved).
+    """
+    reader = PdfReader(str(path))
+    n_pages = len(reader.pages)
+    if workers <= 1 or n_pages < PDF_PARALLEL_MIN_PAGES:
+        return _pdf_page_blocks(reader, 0, n_pages)
 
-    # Minimal table extraction: join cells with tabs
-    for table in doc.tables:
-        for row in table.rows:
-            cells = [_clean(c.text).replace("\n", " ") for c in row.cells]
-            if any(cells):
-                lines.append("\t".join(cells))
+    # A few ranges per worker to even out pages of uneven cost
+    n_ranges = min(n_pages, workers * 4)
+    step = math.ceil(n_pages / n_ranges)
+    starts = list(range(0, n_pages, step))
+    with ProcessPoolExecutor(max_workers=min(workers, len(starts))) as ex:
+        parts = ex.map(_extract_pdf_pages, [path] * len(starts), starts, [s + step for s in starts])
+        return [b for part in parts for b in part]
 
-    return [Block(page=None, text="\n".join(lines))]
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P, _W_T, _W_TBL, _W_TR, _W_TC = _W + "p", _W + "t", _W + "tbl", _W + "tr", _W + "tc"
+_W_RUN_CHARS = {_W + "tab": "\t", _W + "br": "\n", _W + "cr": "\n"}
+_W_GRID_SPAN, _W_VMERGE, _W_VAL = _W + "gridSpan", _W + "vMerge", _W + "val"
+
+
+def extract_docx(path: Path) -> List[Block]:
+    """
+    Stream word/document.xml instead of building the python-docx object model.
+    Same output layout: body paragraphs first, then one tab-joined line per
+    row of each top-level table (a cell's paragraphs joined by spaces).
+    Like python-docx row.cells, a merged cell's text is repeated in every grid
+    column it spans (w:gridSpan) and every row it continues into (w:vMerge).
+    """
+    lines: List[str] = []
+    table_lines: List[str] = []
+    tbl_depth = 0
+    runs: List[List[str]] = []  # text of each open paragraph (text boxes can nest them)
+    row: List[str] = []  # cell text per grid column
+    prev_row: List[str] = []  # previous row of the same table, for vMerge continuations
+    cell: List[str] = []
+    span, merged = 1, False  # current cell's w:gridSpan / continues a vertical merge
+
+    with zipfile.ZipFile(path) as z, z.open("word/document.xml") as f:
+        for event, el in ET.iterparse(f, events=("start", "end")):
+            tag = el.tag
+            if event == "start":
+                if tag == _W_P:
+                    runs.append([])
+                elif tag == _W_TBL:
+                    tbl_depth += 1
+                    if tbl_depth == 1:
+                        prev_row = []
+                elif tbl_depth == 1 and tag == _W_TR:
+                    row = []
+                elif tbl_depth == 1 and tag == _W_TC:
+                    cell = []
+                    span, merged = 1, False
+                elif tbl_depth == 1 and tag == _W_GRID_SPAN:
+                    span = max(1, int(el.get(_W_VAL, "1")))
+                elif tbl_depth == 1 and tag == _W_VMERGE:
+                    merged = el.get(_W_VAL, "continue") != "restart"
+                continue
+
+            if tag == _W_T:
+                if runs:
+                    runs[-1].append(el.text or "")
+            elif tag in _W_RUN_CHARS:
+                if runs:
+                    runs[-1].append(_W_RUN_CHARS[tag])
+            elif tag == _W_P:
+                t = _clean("".join(runs.pop()))
+                if tbl_depth == 0 and not runs:
+                    if t:
+                        lines.append(t)
+                elif tbl_depth == 1 and not runs:
+                    cell.append(t)
+                el.clear()
+            elif tag == _W_TBL:
+                tbl_depth -= 1
+                el.clear()
+            elif tbl_depth == 1 and tag == _W_TC:
+                text = _clean("\n".join(cell)).replace("\n", " ")
+                if merged and len(row) < len(prev_row):
+                    text = prev_row[len(row)]
+                row.extend([text] * span)
+            elif tbl_depth == 1 and tag == _W_TR:
+                if any(row):
+                    table_lines.append("\t".join(row))
+                prev_row = row
+
+    # Minimal table extraction: tables follow the body text, cells joined with tabs
+    return [Block(page=None, text="\n".join(lines + table_lines))]
 
 
 def extract_textfile(path: Path) -> List[Block]:
@@ -126,13 +249,9 @@ def extract_textfile(path: Path) -> List[Block]:
 
 
 def extract_csv(path: Path, max_rows: int = 3000) -> List[Block]:
-    rows: List[str] = []
     with path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
-        reader = csv.reader(f)
-        for i, row in enumerate(reader):
-            if i >= max_rows:
-                break
-            rows.append("\t".join([_clean(c) for c in row]))
+        # csv.reader is the C tokenizer; islice stops reading at max_rows
+        rows = ["\t".join(map(_clean, row)) for row in islice(csv.reader(f), max_rows)]
     return [Block(page=None, text="\n".join(rows))]
 
 
@@ -160,15 +279,172 @@ def extract_document(path: Path) -> List[Block]:
     return [Block(page=None, text="")]
 
 
+def _extract_safe(path: Path) -> List[Block]:
+    # Top-level (picklable) so it can run in worker processes; a bad file yields no blocks
+    try:
+        return extract_document(path)
+    except Exception:
+        return []
+
+
+def extract_all(docs: List[Path], workers: Optional[int] = None) -> List[List[Block]]:
+    """
+    Extract every document, fanning out over a process pool (PDF/DOCX parsing is CPU-bound).
+    Results are in the same order as `docs`. workers=1 extracts in-process.
+    """
+    n_workers = workers or os.cpu_count() or 1
+    if len(docs) == 1 and docs[0].suffix.lower() == ".pdf":
+        # Nothing to spread across files; spread the pages of the one PDF instead
+        try:
+            return [extract_pdf(docs[0], workers=n_workers)]
+        except Exception:
+            return [[]]
+    if n_workers <= 1 or len(docs) < 2:
+        return [_extract_safe(p) for p in docs]
+    n_workers = min(n_workers, len(docs))
+    chunksize = max(1, len(docs) // (n_workers * 4))
+    with ProcessPoolExecutor(max_workers=n_workers) as ex:
+        return list(ex.map(_extract_safe, docs, chunksize=chunksize))
+
+
 # -----------------------
 # Index builder
 # -----------------------
 
+def encode_to_memmap(embedder, texts: List[str], path: Path, batch_size: int, pool=None) -> np.memmap:
+    """
+    Encode `texts` EMBED_CHUNK_ROWS at a time into a float32 memmap at `path`,
+    so peak RAM holds one slice of vectors rather than the whole matrix.
+    With `pool` (from start_multi_process_pool), each slice is spread over its workers.
+
+    Slices are cut from the texts sorted by length (longest first) and written
+    back to their original rows, so every mini-batch holds similar-length
+    chunks: SentenceTransformer.encode only sorts within one call.
+    """
+    X: Optional[np.memmap] = None
+    n = len(texts)
+    rows = EMBED_CHUNK_ROWS * len(pool["processes"]) if pool else EMBED_CHUNK_ROWS
+    order = np.argsort([-len(t) for t in texts], kind="stable")
+    for i in range(0, n, rows):
+        dst = order[i : i + rows]
+        batch = [texts[j] for j in dst]
+        if pool:
+            enc = np.ascontiguousarray(
+                embedder.encode_multi_process(batch, pool, batch_size=batch_size), dtype="float32"
+            )
+            faiss.normalize_L2(enc)
+        else:
+            enc = embedder.encode(
+                batch,
+                batch_size=batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        if X is None:
+            X = np.memmap(path, dtype="float32", mode="w+", shape=(n, enc.shape[1]))
+        X[dst] = enc
+        print(f"\r   Embedded {min(i + rows, n)}/{n} chunks", end="", flush=True)
+    print()
+    X.flush()
+    return X
+
+
+def make_index(X: np.ndarray, quant: str = "none", ann: str = "auto") -> Tuple["faiss.Index", str, Optional[int]]:
+    """
+    Build an inner-product FAISS index over normalized vectors X.
+    ann="auto" is exact below IVF_MIN_CHUNKS and IVF above; "hnsw" always builds HNSW.
+    Returns (index, factory_string, nprobe or None).
+    """
+    if quant not in QUANT_ENCODINGS:
+        raise ValueError(f"quant must be one of {sorted(QUANT_ENCODINGS)}, got {quant!r}")
+    if ann not in ANN_KINDS:
+        raise ValueError(f"ann must be one of {ANN_KINDS}, got {ann!r}")
+    encoding = QUANT_ENCODINGS[quant]
+
+    n, d = X.shape
+    nprobe: Optional[int] = None
+    if ann == "hnsw":
+        spec = f"HNSW{HNSW_M},{encoding}"
+    elif n >= IVF_MIN_CHUNKS:
+        nlist = max(64, int(4 * math.sqrt(n)))
+        spec = f"IVF{nlist},{encoding}"
+        nprobe = IVF_NPROBE
+    else:
+        spec = encoding
+
+    index = faiss.index_factory(d, spec, faiss.METRIC_INNER_PRODUCT)
+    if ann == "hnsw":
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH  # saved with the index
+    if not index.is_trained:
+        index.train(X)
+    index.add(X)
+    if nprobe is not None:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    return index, spec, nprobe
+
+
+def _file_sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _load_previous(
+    store_dir: Path, model_name: str, backend: str
+) -> Tuple[Dict[str, Dict[str, Any]], Sequence[Dict[str, Any]], Optional[np.memmap]]:
+    """
+    Per-file cache, records and vectors from the previous build in `store_dir`.
+    Returns empty results when there is nothing reusable (no build, other model/backend).
+    """
+    empty: Tuple[Dict[str, Dict[str, Any]], Sequence[Dict[str, Any]], Optional[np.memmap]] = ({}, [], None)
+    try:
+        meta = json.loads((store_dir / "meta.json").read_text(encoding="utf-8"))
+        cache = json.loads((store_dir / "cache.json").read_text(encoding="utf-8"))
+        records = load_records(store_dir, meta.get("records_format", "json"))
+    except (OSError, ValueError, RuntimeError):
+        return empty
+    if meta.get("model_name") != model_name or meta.get("backend", "torch") != backend or not meta.get("dim"):
+        return empty
+
+    # A build that stopped partway leaves cache.json missing or tagged with a build
+    # meta.json doesn't name; its row ranges would point into the wrong vectors
+    build = meta.get("build")
+    if not build or cache.get("build") != build or not meta.get("embeddings_file") or not records:
+        return empty
+    dim = int(meta["dim"])
+    emb_path = store_dir / meta["embeddings_file"]
+    try:
+        if emb_path.stat().st_size != len(records) * dim * 4:
+            return empty
+    except OSError:
+        return empty
+    X = np.memmap(emb_path, dtype="float32", mode="r", shape=(len(records), dim))
+    return cache.get("files", {}), records, X
+
+
 def build_index(
     docs_root: Path,
     store_dir: Path,
     model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    quant: str = "none",
+    backend: str = "torch",
+    workers: Optional[int] = None,
+    full: bool = False,
+    records_format: str = "json",
+    fp16: bool = False,
+    ann: str = "auto",
 ) -> None:
+    """
+    Index everything under docs_root into store_dir.
+
+    Incremental by default: files whose (mtime, size) or sha1 match cache.json from
+    the previous build reuse their records and vectors; only new/changed files are
+    extracted and embedded. full=True ignores the previous build.
+    """
     docs_root = docs_root.resolve()
     store_dir = store_dir.resolve()
     store_dir.mkdir(parents=True, exist_ok=True)
@@ -177,48 +453,125 @@ def build_index(
     if not docs:
         raise RuntimeError(f"No supported files found under: {docs_root}")
 
-    embedder = SentenceTransformer(model_name)
+    prev_cache, prev_records, prev_X = ({}, [], None) if full else _load_previous(store_dir, model_name, backend)
+
+    # Decide per file: reuse a row range of the previous build, or re-extract
+    plan: List[Tuple[Path, str, Dict[str, Any], Optional[Tuple[int, int]]]] = []
+    for doc_path in docs:
+        rel = doc_path.relative_to(docs_root).as_posix()
+        st = doc_path.stat()
+        entry: Dict[str, Any] = {"mtime": st.st_mtime, "size": st.st_size}
+        old = prev_cache.get(rel) if prev_X is not None else None
+        if old and old.get("mtime") == entry["mtime"] and old.get("size") == entry["size"]:
+            entry["sha1"] = old["sha1"]
+        else:
+            entry["sha1"] = _file_sha1(doc_path)
+        reuse = (old["start"], old["end"]) if old and old.get("sha1") == entry["sha1"] else None
+        plan.append((doc_path, rel, entry, reuse))
+
+    to_extract = [doc_path for doc_path, _, _, reuse in plan if reuse is None]
+    extracted = dict(zip(to_extract, extract_all(to_extract, workers=workers)))
 
     records: List[Dict[str, Any]] = []
-    texts: List[str] = []
+    new_texts: List[str] = []
+    new_rows: List[int] = []  # row in `records` for each entry of new_texts
+    reused_ranges: List[Tuple[int, int, int]] = []  # (dst_start, src_start, src_end)
+    cache: Dict[str, Dict[str, Any]] = {}
 
     num_no_text = 0
 
-    for doc_path in docs:
-        rel = doc_path.relative_to(docs_root).as_posix()
-
-        try:
-            blocks = extract_document(doc_path)
-        except Exception:
-            blocks = []
-
-        has_text = False
-        for block in blocks:
-            for ci, chunk in enumerate(chunk_text(block.text)):
-                has_text = True
-                records.append(
-                    {
-                        "source_path": rel,
-                        "page": block.page,
-                        "chunk_index": ci,
-                        "text": chunk,
-                    }
-                )
-                texts.append(chunk)
-
-        if not has_text:
+    for doc_path, rel, entry, reuse in plan:
+        start = len(records)
+
+        if reuse is not None:
+            src_start, src_end = reuse
+            records.extend(prev_records[src_start:src_end])
+            reused_ranges.append((start, src_start, src_end))
+        else:
+            for block in extracted[doc_path]:
+                for ci, chunk in enumerate(chunk_text(block.text)):
+                    records.append(
+                        {
+                            "source_path": rel,
+                            "page": block.page,
+                            "chunk_index": ci,
+                            "text": chunk,
+                        }
+                    )
+                    new_rows.append(len(records) - 1)
+                    new_texts.append(chunk)
+
+        if len(records) == start:
             num_no_text += 1
+        cache[rel] = {**entry, "start": start, "end": len(records)}
 
-    if not texts:
+    if not records:
         raise RuntimeError("No extractable text found. PDFs may be scanned/image-only (needs OCR in a separate pipeline).")
 
-    X = np.asarray(embedder.encode(texts, normalize_embeddings=True), dtype="float32")
-    index = faiss.IndexFlatIP(X.shape[1])
-    index.add(X)
-
-    faiss.write_index(index, str(store_dir / "index.faiss"))
-    (store_dir / "records.json").write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding="utf-8")
-    (store_dir / "meta.json").write_text(
+    device = pick_device()
+    embedder = None
+    new_X: Optional[np.memmap] = None
+    new_path = store_dir / "embeddings.new.f32"
+    # Identical chunks (boilerplate headers, repeated rows, copied files) are encoded
+    # once; every record keeps its own row, pointing at the shared vector.
+    unique_pos: Dict[str, int] = {}
+    new_src = [unique_pos.setdefault(t, len(unique_pos)) for t in new_texts]
+    if new_texts:
+        # Load the model only after extraction: worker processes are gone by now
+        # (no fork after CUDA init) and nothing is loaded if there is no new text.
+        embedder = load_embedder(model_name, device=device, backend=backend, fp16=fp16, compile=fp16)
+        pool = None
+        if device == "cpu" and backend == "torch" and len(unique_pos) >= MULTI_PROCESS_MIN_CHUNKS:
+            pool = embedder.start_multi_process_pool()
+        try:
+            new_X = encode_to_memmap(
+                embedder, list(unique_pos), new_path, batch_size=encode_batch_size(device), pool=pool
+            )
+        finally:
+            if pool:
+                embedder.stop_multi_process_pool(pool)
+
+    dim = int(new_X.shape[1]) if new_X is not None else int(prev_X.shape[1])
+
+    # Assemble the full matrix under this build's own name: the previous build's
+    # matrix is still being read here, and stays valid until meta.json stops naming it
+    build = secrets.token_hex(8)
+    emb_name = f"embeddings.{build}.f32"
+    emb_path = store_dir / emb_name
+    X = np.memmap(emb_path, dtype="float32", mode="w+", shape=(len(records), dim))
+    for dst, src_start, src_end in reused_ranges:
+        X[dst : dst + (src_end - src_start)] = prev_X[src_start:src_end]
+    for i in range(0, len(new_rows), EMBED_CHUNK_ROWS):
+        X[new_rows[i : i + EMBED_CHUNK_ROWS]] = new_X[new_src[i : i + EMBED_CHUNK_ROWS]]
+    X.flush()
+
+    # Close every mapping before swapping files (required on Windows)
+    del X, new_X, prev_X, prev_records
+    new_path.unlink(missing_ok=True)
+    X = np.memmap(emb_path, dtype="float32", mode="r", shape=(len(records), dim))
+
+    index, index_spec, nprobe = make_index(X, quant=quant, ann=ann)
+
+    # Write aside and swap: a running store may have the old index.faiss memory-mapped
+    index_tmp = store_dir / "index.faiss.tmp"
+    faiss.write_index(index, str(index_tmp))
+    os.replace(index_tmp, store_dir / "index.faiss")
+
+    embedder_path = None
+    if backend == "onnx":
+        # Keep the exported ONNX model next to the index so queries don't re-export it
+        embedder_path = "onnx_model"
+        if embedder is not None:
+            embedder.save(str(store_dir / embedder_path))
+
+    # The old cache.json stops describing records.* as soon as they are rewritten
+    (store_dir / "cache.json").unlink(missing_ok=True)
+    write_records(store_dir, records, fmt=records_format)
+    (store_dir / "cache.json").write_text(
+        json.dumps({"build": build, "files": cache}, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    meta_tmp = store_dir / "meta.json.tmp"
+    meta_tmp.write_text(
         json.dumps(
             {
                 "model_name": model_name,
@@ -229,13 +582,35 @@ def build_index(
                 "num_chunks": len(records),
                 "supported_exts": sorted(SUPPORTED_EXTS),
                 "pdf_extractor": "pypdf",
+                "device": device,
+                "index_factory": index_spec,
+                "quant": quant,
+                "backend": backend,
+                "fp16": fp16 and backend == "torch" and device != "cpu",
+                "embedder_path": embedder_path,
+                "nprobe": nprobe,
+                "ann": ann,
+                "build": build,
+                "embeddings_file": emb_name,
+                "dim": dim,
+                "records_format": records_format,
             },
             indent=2,
         ),
         encoding="utf-8",
     )
+    os.replace(meta_tmp, store_dir / "meta.json")
+
+    # Matrices of earlier or interrupted builds (a running store keeps its open mapping)
+    for old in store_dir.glob("embeddings*.f32"):
+        if old.name != emb_name:
+            try:
+                old.unlink()
+            except OSError:
+                pass  # still mapped on Windows; removed by a later build
 
     print(f"✅ Indexed {len(records)} chunks from {len(docs)} files")
+    print(f"   Re-extracted {len(to_extract)} files, embedded {len(unique_pos)} new chunks ({len(new_texts)} before dedup)")
     print(f"   Store: {store_dir}")
 
 
@@ -244,16 +619,44 @@ def main():
     docs_root = base_dir / "resources" / "data"
     store_dir = base_dir / "resources" / ".rag_store"
     model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    quant = "none"
+    backend = "torch"
+    workers = None
 
     args = sys.argv[1:]
+    full = "--full" in args
+    fp16 = "--fp16" in args
+    ann = "auto"
+    records_format = "json"
     if "--docs" in args:
         docs_root = Path(args[args.index("--docs") + 1])
     if "--store" in args:
         store_dir = Path(args[args.index("--store") + 1])
     if "--model" in args:
         model_name = args[args.index("--model") + 1]
-
-    build_index(docs_root=docs_root, store_dir=store_dir, model_name=model_name)
+    if "--quant" in args:
+        quant = args[args.index("--quant") + 1]
+    if "--backend" in args:
+        backend = args[args.index("--backend") + 1]
+    if "--workers" in args:
+        workers = int(args[args.index("--workers") + 1])
+    if "--ann" in args:
+        ann = args[args.index("--ann") + 1]
+    if "--records" in args:
+        records_format = args[args.index("--records") + 1]
+
+    build_index(
+        docs_root=docs_root,
+        store_dir=store_dir,
+        model_name=model_name,
+        quant=quant,
+        backend=backend,
+        workers=workers,
+        full=full,
+        records_format=records_format,
+        fp16=fp16,
+        ann=ann,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+# rag/qcache.py
+"""
+Evidence caches: formatted retrieval results for recently seen queries.
+
+ExactCache is keyed by the exact query string (hashed); a hit costs one dict
+lookup. SemanticCache is keyed by query embedding: a lookup is a brute-force
+inner product over the cached (L2-normalized) query vectors and the best match
+at or above `tau` cosine similarity is a hit. In both, entries expire after
+`ttl` seconds and the least recently used one is evicted when full.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class ExactCache:
+    def __init__(self, capacity: int = 2048, ttl: float = 300.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        # digest -> (inserted_at, blob); OrderedDict gives LRU order
+        self._items: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query: str) -> bytes:
+        return hashlib.blake2b(query.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, query: str) -> Optional[str]:
+        key = self._key(query)
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None:
+                return None
+            if time.time() - hit[0] > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return hit[1]
+
+    def put(self, query: str, blob: str) -> None:
+        key = self._key(query)
+        with self._lock:
+            self._items[key] = (time.time(), blob)
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+
+class SemanticCache:
+    def __init__(self, dim: int, capacity: int = 256, tau: float = 0.95, ttl: float = 300.0):
+        self.tau = tau
+        self.ttl = ttl
+        self._vecs = np.zeros((capacity, dim), dtype="float32")
+        self._blobs: List[Optional[str]] = [None] * capacity
+        self._stamp = np.full(capacity, -np.inf)  # insert time; -inf marks a free slot
+        self._used = np.zeros(capacity)  # last hit/insert time, for LRU eviction
+        self._lock = threading.Lock()
+
+    def get(self, qvec: np.ndarray) -> Optional[str]:
+        now = time.time()
+        q = np.asarray(qvec, dtype="float32").reshape(-1)
+        with self._lock:
+            sims = self._vecs @ q
+            sims[now - self._stamp > self.ttl] = -np.inf  # expired and free slots never match
+            i = int(np.argmax(sims))
+            if sims[i] < self.tau:
+                return None
+            self._used[i] = now
+            return self._blobs[i]
+
+    def put(self, qvec: np.ndarray, blob: str) -> None:
+        now = time.time()
+        with self._lock:
+            expired = np.flatnonzero(now - self._stamp > self.ttl)
+            i = int(expired[0]) if len(expired) else int(np.argmin(self._used))
+            self._vecs[i] = np.asarray(qvec, dtype="float32").reshape(-1)
+            self._blobs[i] = blob
+            self._stamp[i] = now
+            self._used[i] = now
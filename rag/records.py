@@ -0,0 +1,202 @@
+# rag/records.py
+"""
+Read/write the chunk records of a store.
+
+Formats (meta.json "records_format"):
+- "json"    records.json, a compact JSON list (default). Uses orjson when
+            installed (C encoder/decoder); falls back to the stdlib.
+            Held in memory as parallel columns (ColumnRecords), not one dict per chunk.
+- "jsonl"   records.jsonl, one compact record per line, plus records.offsets
+            (int64 byte offsets). Memory-mapped on load; a hit parses one line.
+            Both files end with the same random build token, so a reader can
+            tell a matching pair from one caught mid-rebuild.
+- "parquet" records.parquet, columnar (source_path dictionary-encoded, zstd).
+            The table is decompressed into Arrow memory on load (per process);
+            record dicts are materialized only when accessed.
+            Needs pyarrow.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import secrets
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Union
+
+import numpy as np
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+RECORDS_FILES = {"json": "records.json", "jsonl": "records.jsonl", "parquet": "records.parquet"}
+OFFSETS_FILE = "records.offsets"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # type: ignore
+        import pyarrow.parquet  # type: ignore
+    except Exception as e:
+        raise RuntimeError("pyarrow required for parquet records. Install with: pip install pyarrow") from e
+    return pyarrow, pyarrow.parquet
+
+
+class ParquetRecords(Sequence):
+    """
+    Read-only, list-like view over records.parquet.
+    Indexing builds one record dict; slicing/iteration convert in bulk.
+    """
+
+    def __init__(self, path: Path):
+        _, pq = _require_pyarrow()
+        self._table = pq.read_table(str(path), memory_map=True)
+
+    def __len__(self) -> int:
+        return self._table.num_rows
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            return self._table.slice(start, max(0, stop - start)).to_pylist()
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("record index out of range")
+        return {name: self._table.column(name)[i].as_py() for name in self._table.column_names}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for batch in self._table.to_batches():
+            yield from batch.to_pylist()
+
+
+class ColumnRecords(Sequence):
+    """
+    Records held as parallel lists (source paths interned), so a large corpus
+    costs a few list slots per chunk instead of a dict each. Indexing builds
+    the record dict on demand.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.source_paths = [sys.intern(r["source_path"]) for r in records]
+        self.pages = [r.get("page") for r in records]
+        self.chunk_indices = [r.get("chunk_index") for r in records]
+        self.texts = [r["text"] for r in records]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return {
+            "source_path": self.source_paths[i],
+            "page": self.pages[i],
+            "chunk_index": self.chunk_indices[i],
+            "text": self.texts[i],
+        }
+
+
+class JsonlRecords(Sequence):
+    """
+    Read-only, list-like view over records.jsonl.
+    Record i is bytes offsets[i]:offsets[i + 1] of the mapped file.
+    """
+
+    def __init__(self, path: Path, offsets_path: Path):
+        offsets = np.fromfile(offsets_path, dtype=np.int64)
+        # n + 1 offsets, then the build token
+        self._offsets, token = offsets[:-1], int(offsets[-1]) if len(offsets) else None
+        with path.open("rb") as f:
+            # Slicing an mmap needs no seek, so concurrent readers don't need a lock
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            ok = len(self._offsets) > 0 and _loads(self._data[self._offsets[-1] :]) == {"_build": token}
+        except ValueError:
+            ok = False
+        if not ok:
+            raise RuntimeError(f"{path.name} and {offsets_path.name} are from different builds (rebuild in progress?)")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("record index out of range")
+        return _loads(self._data[self._offsets[i] : self._offsets[i + 1]])
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def write_records(store_dir: Path, records: List[Dict[str, Any]], fmt: str = "json") -> None:
+    if fmt not in RECORDS_FILES:
+        raise ValueError(f"records format must be one of {sorted(RECORDS_FILES)}, got {fmt!r}")
+
+    path = store_dir / RECORDS_FILES[fmt]
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "parquet":
+        pa, pq = _require_pyarrow()
+        tbl = pa.table(
+            {
+                "source_path": pa.array([r["source_path"] for r in records], pa.string()).dictionary_encode(),
+                "page": pa.array([r.get("page") for r in records], pa.int32()),
+                "chunk_index": pa.array([r.get("chunk_index") for r in records], pa.int32()),
+                "text": pa.array([r["text"] for r in records], pa.string()),
+            }
+        )
+        pq.write_table(tbl, str(tmp), compression="zstd")
+    elif fmt == "jsonl":
+        token = secrets.randbits(63)
+        offsets = np.empty(len(records) + 2, dtype=np.int64)
+        offsets[0] = 0
+        with tmp.open("wb") as f:
+            for i, r in enumerate(records):
+                line = _dumps(r) + b"\n"
+                f.write(line)
+                offsets[i + 1] = offsets[i] + len(line)
+            f.write(_dumps({"_build": token}) + b"\n")
+        offsets[-1] = token
+        offsets_tmp = store_dir / (OFFSETS_FILE + ".tmp")
+        offsets.tofile(offsets_tmp)
+        os.replace(offsets_tmp, store_dir / OFFSETS_FILE)
+    else:
+        tmp.write_bytes(_dumps(records))
+    # Swap in whole files: a running store may have the old ones memory-mapped
+    os.replace(tmp, path)
+
+    # Drop files left by a previous build in another format
+    for other, name in RECORDS_FILES.items():
+        if other != fmt:
+            (store_dir / name).unlink(missing_ok=True)
+    if fmt != "jsonl":
+        (store_dir / OFFSETS_FILE).unlink(missing_ok=True)
+
+
+def load_records(store_dir: Path, fmt: str = "json") -> Sequence[Dict[str, Any]]:
+    if fmt not in RECORDS_FILES:
+        raise ValueError(f"records format must be one of {sorted(RECORDS_FILES)}, got {fmt!r}")
+    path = store_dir / RECORDS_FILES[fmt]
+    if fmt == "parquet":
+        return ParquetRecords(path)
+    if fmt == "jsonl":
+        return JsonlRecords(path, store_dir / OFFSETS_FILE)
+    return ColumnRecords(_loads(path.read_bytes()))
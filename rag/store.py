@@ -1,31 +1,246 @@
+import hashlib
 import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from rag.embedder import load_embedder, pick_device
+from rag.records import load_records
+
+# Query embedding cache (repeated questions skip the encoder entirely)
+QUERY_CACHE_SIZE = 1024
+# Seconds before a cached query vector expires; 0 disables expiry
+QUERY_CACHE_TTL = float(os.getenv("RAG_QUERY_CACHE_TTL", "0") or 0)
+
+# "int8": re-encode an exact (Flat) index as int8 scalar-quantized vectors at load,
+# 4x less memory scanned per query; "none" (default) searches the stored index as-is
+STORE_QUANT = os.getenv("RAG_STORE_QUANT", "none").strip().lower()
+
+# Rows per add() when re-encoding from embeddings.f32
+_QUANT_ADD_ROWS = 65536
+
+_WS = re.compile(r"\s+")
+
+
+def _normalize_query(text: str) -> str:
+    return _WS.sub(" ", (text or "").strip().lower())
+
+
+def _read_index(path: Path) -> "faiss.Index":
+    # Memory-map read-only: pages load on demand and are shared between processes.
+    # IO_FLAG_MMAP_IFC (newer faiss) maps the codes of Flat/SQ/HNSW storage too;
+    # plain IO_FLAG_MMAP maps only IVF inverted lists. Otherwise a normal read.
+    for flag_name in ("IO_FLAG_MMAP_IFC", "IO_FLAG_MMAP"):
+        flag = getattr(faiss, flag_name, None)
+        if flag is None:
+            continue
+        try:
+            return faiss.read_index(str(path), flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass
+    return faiss.read_index(str(path))
+
+
+def _open_embeddings(store_dir: Path, meta: Dict[str, Any]) -> Optional[np.memmap]:
+    # Read-only map of embeddings.f32: processes share the page cache, nothing is copied
+    if not meta.get("embeddings_file") or not meta.get("dim"):
+        return None
+    dim = int(meta["dim"])
+    return np.memmap(store_dir / meta["embeddings_file"], dtype="float32", mode="r").reshape(-1, dim)
+
+
+def _int8_index(X: np.memmap) -> "faiss.Index":
+    """
+    Flat inner-product index over int8 scalar-quantized copies of embeddings.f32
+    (per-dimension ranges; faiss decodes with SIMD during the scan).
+    """
+    dim = X.shape[1]
+    index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    # Ranges come from an evenly spaced sample, so training doesn't load the whole matrix
+    index.train(np.ascontiguousarray(X[:: max(1, len(X) // _QUANT_ADD_ROWS)]))
+    for i in range(0, len(X), _QUANT_ADD_ROWS):
+        index.add(np.ascontiguousarray(X[i : i + _QUANT_ADD_ROWS]))
+    return index
 
 
 class LocalRAGStore:
-    def __init__(self, store_dir: Path):
+    def __init__(self, store_dir: Path, quant: str = STORE_QUANT):
         self.store_dir = store_dir
-        self.index = faiss.read_index(str(store_dir / "index.faiss"))
-        self.records: List[Dict[str, Any]] = json.loads((store_dir / "records.json").read_text(encoding="utf-8"))
         meta = json.loads((store_dir / "meta.json").read_text(encoding="utf-8"))
-        self.embedder = SentenceTransformer(meta["model_name"])
+        if quant not in ("none", "int8"):
+            raise ValueError(f"quant must be 'none' or 'int8', got {quant!r}")
+        # (N, d) float32 corpus vectors, memory-mapped (None for stores built before embeddings.f32)
+        self.embeddings = _open_embeddings(store_dir, meta)
+        exact = meta.get("quant", "none") == "none" and not meta.get("nprobe") and meta.get("ann", "auto") == "auto"
+        if quant == "int8" and exact and self.embeddings is not None:
+            self.index = _int8_index(self.embeddings)
+        else:
+            # Already quantized / IVF / HNSW (build with --quant sq8 instead) or an older store
+            self.index = _read_index(store_dir / "index.faiss")
+        self.records: Sequence[Dict[str, Any]] = load_records(store_dir, meta.get("records_format", "json"))
+        self.model_name = meta["model_name"]
+        self.device = pick_device()
+        # Prefer the model saved next to the index (e.g. the exported ONNX model)
+        embedder_src = self.model_name
+        if meta.get("embedder_path"):
+            embedder_src = str(store_dir / meta["embedder_path"])
+        self.embedder = load_embedder(
+            embedder_src,
+            device=self.device,
+            backend=meta.get("backend", "torch"),
+            fp16=bool(meta.get("fp16")),
+        )
+
+        # IVF indexes: clusters visited per query (RAG_NPROBE overrides the build-time value;
+        # the build records nprobe only for IVF, and flat/HNSW indexes have no clusters)
+        if meta.get("nprobe"):
+            nprobe = int(os.getenv("RAG_NPROBE", "0") or 0) or meta["nprobe"]
+            faiss.extract_index_ivf(self.index).nprobe = int(nprobe)
+
+        # HNSW indexes: candidate list size per query (higher = better recall, slower)
+        ef_search = int(os.getenv("RAG_EF_SEARCH", "0") or 0)
+        if ef_search and meta.get("ann") == "hnsw":
+            self.index.hnsw.efSearch = ef_search
+
+        # Move the index to GPU when the embedder runs on CUDA and faiss-gpu is installed
+        # (faiss has no GPU HNSW or flat scalar-quantizer index; those stay on CPU)
+        self._gpu_res = None
+        gpu_ok = hasattr(faiss, "StandardGpuResources") and meta.get("ann") != "hnsw"
+        if self.device == "cuda" and gpu_ok and faiss.get_num_gpus() > 0:
+            res = faiss.StandardGpuResources()
+            try:
+                self.index = faiss.index_cpu_to_gpu(res, 0, self.index)
+                self._gpu_res = res  # must outlive the GPU index
+            except RuntimeError:
+                pass  # e.g. --quant sq8/fp16 or RAG_STORE_QUANT=int8: "not implemented on GPU"
+        # GPU indexes and their resources are not thread-safe; CPU searches run concurrently
+        self._search_lock = threading.Lock() if self._gpu_res is not None else nullcontext()
+
+        # key -> (inserted_at, vector); OrderedDict gives LRU order
+        self._qcache: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._qcache_lock = threading.Lock()
+        # HF tokenizers are not safe to share across threads; serialize encoder calls
+        self._encode_lock = threading.Lock()
+
+        # (source_path, page) -> record ids, built on first page lookup
+        self._by_page: Optional[Dict[Tuple[str, Any], List[int]]] = None
+        self._by_page_lock = threading.Lock()
+
+        self._warmup()
+
+    def _warmup(self) -> None:
+        # One throwaway encode + search at load, so lazy init (kernel selection,
+        # allocator pools, GPU transfers, mmapped index pages) isn't paid by the first query
+        vec = np.asarray(self.embedder.encode(["warmup"], normalize_embeddings=True), dtype="float32")
+        self._index_search(vec, 1)
+
+    def embed(self, query: str) -> np.ndarray:
+        """
+        Embed a query as a (1, d) float32 array, memoized per normalized text + model.
+        """
+        return self.embed_batch([query])
+
+    def embed_batch(self, queries: List[str]) -> np.ndarray:
+        """
+        Embed several queries as a (B, d) float32 array.
+        Cache misses are encoded together in one encoder call.
+        """
+        texts = [_normalize_query(q) for q in queries]
+        keys = [hashlib.sha1(t.encode("utf-8")).hexdigest() + self.model_name for t in texts]
+        now = time.time()
+
+        vecs: List[Optional[np.ndarray]] = [self._qcache_get(key, now) for key in keys]
+        missing = [i for i, v in enumerate(vecs) if v is None]
+
+        if missing:
+            with self._encode_lock:
+                # A concurrent caller may have embedded some of these while we waited
+                for i in missing:
+                    vecs[i] = self._qcache_get(keys[i], now)
+                missing = [i for i in missing if vecs[i] is None]
+
+                if missing:
+                    todo = list(dict.fromkeys(texts[i] for i in missing))
+                    enc = np.asarray(self.embedder.encode(todo, normalize_embeddings=True), dtype="float32")
+                    # Cached vectors are handed out as-is; make them (and their views) read-only
+                    enc.flags.writeable = False
+                    by_text = {t: enc[j : j + 1] for j, t in enumerate(todo)}
+
+                    with self._qcache_lock:
+                        for i in missing:
+                            vecs[i] = by_text[texts[i]]
+                            self._qcache[keys[i]] = (now, vecs[i])
+                            self._qcache.move_to_end(keys[i])
+                        while len(self._qcache) > QUERY_CACHE_SIZE:
+                            self._qcache.popitem(last=False)
+
+        return vecs[0] if len(vecs) == 1 else np.vstack(vecs)
+
+    def _qcache_get(self, key: str, now: float) -> Optional[np.ndarray]:
+        with self._qcache_lock:
+            hit = self._qcache.get(key)
+            if hit is None:
+                return None
+            if QUERY_CACHE_TTL and now - hit[0] > QUERY_CACHE_TTL:
+                del self._qcache[key]
+                return None
+            self._qcache.move_to_end(key)
+            return hit[1]
 
     def search(self, query: str, k: int = 6) -> List[Dict[str, Any]]:
-        q = self.embedder.encode([query], normalize_embeddings=True).astype("float32")
-        scores, idxs = self.index.search(q, k)
+        return self.search_with_vec(self.embed(query), k=k)
+
+    def search_with_vec(self, vec: np.ndarray, k: int = 6) -> List[Dict[str, Any]]:
+        """
+        Search with an already-embedded (1, d) query vector.
+        """
+        scores, idxs = self._index_search(vec, k)
+        return self._hits(scores[0], idxs[0])
+
+    def search_batch(self, queries: List[str], k: int = 6) -> List[List[Dict[str, Any]]]:
+        """
+        Search several queries with one encoder call and one index.search call.
+        """
+        if not queries:
+            return []
+        Q = self.embed_batch(queries)
+        scores, idxs = self._index_search(Q, k)
+        return [self._hits(scores[b], idxs[b]) for b in range(len(queries))]
+
+    def _index_search(self, Q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._search_lock:
+            return self.index.search(Q, k)
+
+    def page_record_ids(self, source_path: str, page: Any) -> List[int]:
+        """
+        Ids of the records of one document page, in index order.
+        """
+        if self._by_page is None:
+            with self._by_page_lock:
+                if self._by_page is None:
+                    by_page: Dict[Tuple[str, Any], List[int]] = {}
+                    for i, r in enumerate(self.records):
+                        by_page.setdefault((r.get("source_path", ""), r.get("page")), []).append(i)
+                    self._by_page = by_page
+        return self._by_page.get((source_path, page), [])
 
+    def _hits(self, scores: np.ndarray, idxs: np.ndarray) -> List[Dict[str, Any]]:
         out = []
-        for score, idx in zip(scores[0].tolist(), idxs[0].tolist()):
+        for score, idx in zip(scores.tolist(), idxs.tolist()):
             if idx < 0:
                 continue
             r = self.records[idx]
             out.append(
                 {
+                    "id": idx,
                     "score": float(score),
                     "source_path": r["source_path"],
                     "chunk_index": r["chunk_index"],
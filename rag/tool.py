@@ -1,28 +1,56 @@
 # rag/tool.py
 from __future__ import annotations
 
+import asyncio
+import heapq
+import io
+import os
 import re
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
-from typing import Any, Dict, List, Set, Tuple, Optional
+from typing import Any, Dict, FrozenSet, List, Set, Tuple, Optional
+
+import numpy as np
 
 from rag.store import LocalRAGStore
 
 _BASE = Path(__file__).resolve().parents[1]
 _STORE = _BASE / "resources" / ".rag_store"
 _store = LocalRAGStore(_STORE)
+EMBED_DIM = _store.index.d
 
 # Defaults
+DEFAULT_K = 8
 DEFAULT_K1 = 6
 DEFAULT_K2 = 10
 
 MAX_TOTAL_CHARS = 9000
 MAX_PER_CHUNK = 1000
 
+# How long rag_search_race waits for 2-pass evidence before settling for single-pass
+RACE_TIMEOUT = 1.0
+
+# Skip pass 2 when pass 1 fills k1 and its top score reaches this (0 = always run pass 2)
+HIGH_CONF = float(os.getenv("RAG_HIGH_CONF", "0") or 0)
+
 
 # -----------------------
 # Formatting
 # -----------------------
 
+@lru_cache(maxsize=8192)
+def _hit_header(src: str, page: Any, ci: Any) -> str:
+    # The same chunks recur across passes and questions; build each header once
+    header = f"[{src}"
+    if page is not None and page != "":
+        header += f" p.{page}"
+    if ci is not None:
+        header += f" c.{ci}"
+    return header + "]"
+
+
 def _format_hits(
     hits: List[Dict[str, Any]],
     max_total_chars: int = MAX_TOTAL_CHARS,
@@ -32,46 +60,53 @@ def _format_hits(
     Convert retrieval hits into a compact text blob for the LLM.
     Each excerpt is prefixed with: [source p.X c.Y]
     """
-    out: List[str] = []
-    total = 0
+    buf = io.StringIO()
+    total = 0  # excerpt chars written, not counting the blank lines between them
 
     for h in hits:
-        src = h.get("source_path", "unknown")
-        page = h.get("page")
-        ci = h.get("chunk_index")
-
-        header = f"[{src}"
-        if page is not None and page != "":
-            header += f" p.{page}"
-        if ci is not None:
-            header += f" c.{ci}"
-        header += "]"
-
-        txt = (h.get("text") or "").strip().replace("\r\n", "\n")
+        # Chunk text is CRLF-normalized and stripped at index time (index._clean / chunk_text)
+        txt = h.get("text") or ""
         if not txt:
             continue
 
-        txt = txt[:max_per_chunk]
-        block = f"{header}\n{txt}"
+        header = _hit_header(h.get("source_path", "unknown"), h.get("page"), h.get("chunk_index"))
 
-        if total + len(block) > max_total_chars:
+        # Check the budget before building anything for this excerpt
+        size = len(header) + 1 + min(len(txt), max_per_chunk)
+        if total + size > max_total_chars:
             break
 
-        out.append(block)
-        total += len(block)
+        if total:
+            buf.write("\n\n")
+        buf.write(header)
+        buf.write("\n")
+        buf.write(txt[:max_per_chunk])
+        total += size
 
-    return "\n\n".join(out) if out else "NO_HITS"
+    return buf.getvalue() if total else "NO_HITS"
 
 
-def _dedupe_key(h: Dict[str, Any]) -> Tuple[str, Any, Any]:
+def _dedupe_key(h: Dict[str, Any]) -> Any:
+    # (source_path, page, chunk_index) is unique per record, so the record id
+    # identifies the same chunk with a plain int
+    rid = h.get("id")
+    if rid is not None:
+        return rid
     return (h.get("source_path", ""), h.get("page"), h.get("chunk_index"))
 
 
+def embed_query(query: str) -> np.ndarray:
+    """
+    (1, d) normalized query embedding, memoized by the store (so retrieval reuses it).
+    """
+    return _store.embed(query)
+
+
 # -----------------------
 # Single-pass retrieval
 # -----------------------
 
-def rag_search(query: str, k: int = 8) -> str:
+def rag_search(query: str, k: int = DEFAULT_K) -> str:
     """
     Single-pass semantic retrieval from the local vector store.
     """
@@ -93,9 +128,26 @@ _STOP = {
 }
 
 
+# Keep words and hyphenated terms; ignore short tokens
+_RE_TOK = re.compile(r"[a-z][a-z0-9\-]{2,}")
+
+# Generic cue patterns (see _extract_generic_cues), one named group per cue family
+# so a single scan finds them all
+_RE_CUES = re.compile(
+    r"(?P<neq>\bn\s*=\s*\d+)"
+    r"|(?P<tabfig>\b(?:table|figure|fig\.?|appendix|supplement|supplementary)\b)"
+    r"|(?P<stats>\b(?:mean|median|range|sd|std|p[- ]?value|confidence interval|ci)\b)",
+    re.IGNORECASE,
+)
+_CUE_TERMS = {
+    "neq": ("n=", "sample", "cohort"),
+    "tabfig": ("table", "figure", "appendix", "supplementary"),
+    "stats": ("mean", "median", "range", "sd", "p-value", "confidence interval"),
+}
+
+
 def _tokenize(text: str) -> List[str]:
-    # Keep words and hyphenated terms; ignore short tokens
-    return re.findall(r"[a-zA-Z][a-zA-Z0-9\-]{2,}", text.lower())
+    return _RE_TOK.findall(text.lower())
 
 
 def _extract_generic_cues(text: str) -> Set[str]:
@@ -104,21 +156,33 @@ def _extract_generic_cues(text: str) -> Set[str]:
     Domain-agnostic.
     """
     cues: Set[str] = set()
-    t = text.lower()
 
     if "%" in text:
         cues.update({"%", "percent", "percentage"})
 
-    if re.search(r"\bn\s*=\s*\d+", t):
-        cues.update({"n=", "sample", "cohort"})
+    found: Set[str] = set()
+    for m in _RE_CUES.finditer(text):
+        found.add(m.lastgroup)
+        if len(found) == len(_CUE_TERMS):
+            break
+    for family in found:
+        cues.update(_CUE_TERMS[family])
 
-    if re.search(r"\b(table|figure|fig\.?|appendix|supplement|supplementary)\b", t):
-        cues.update({"table", "figure", "appendix", "supplementary"})
+    return cues
 
-    if re.search(r"\b(mean|median|range|sd|std|p[- ]?value|confidence interval|ci)\b", t):
-        cues.update({"mean", "median", "range", "sd", "p-value", "confidence interval"})
 
-    return cues
+def _text_terms(text: str) -> Tuple[Counter, FrozenSet[str]]:
+    """
+    (non-stopword token counts, generic cues) for one chunk of text.
+    """
+    return Counter(t for t in _tokenize(text) if t not in _STOP), frozenset(_extract_generic_cues(text))
+
+
+@lru_cache(maxsize=4096)
+def _record_terms(record_id: int) -> Tuple[Counter, FrozenSet[str]]:
+    # Records never change after load, so a chunk is tokenized once, the first
+    # time it shows up in pass 1. Callers must not mutate the returned Counter.
+    return _text_terms(_store.records[record_id].get("text") or "")
 
 
 def _build_expansion_from_hits(hits: List[Dict[str, Any]], max_terms: int = 18) -> str:
@@ -131,35 +195,25 @@ def _build_expansion_from_hits(hits: List[Dict[str, Any]], max_terms: int = 18)
     if not hits:
         return ""
 
-    freq: Dict[str, int] = {}
+    freq: Counter = Counter()
     cues: Set[str] = set()
 
     # Use only the top few hits to avoid query drift
     for h in hits[:5]:
-        txt = h.get("text") or ""
-        cues |= _extract_generic_cues(txt)
-        for tok in _tokenize(txt):
-            if tok in _STOP:
-                continue
-            freq[tok] = freq.get(tok, 0) + 1
+        rid = h.get("id")
+        toks, hit_cues = _record_terms(rid) if rid is not None else _text_terms(h.get("text") or "")
+        freq.update(toks)
+        cues |= hit_cues
 
-    # Most frequent terms first
-    top = sorted(freq.items(), key=lambda x: (-x[1], x[0]))
-    terms = [t for t, _ in top[:max_terms]]
+    # Most frequent terms first (ties alphabetical); only the top max_terms are ordered
+    top = heapq.nsmallest(max_terms, freq.items(), key=lambda x: (-x[1], x[0]))
+    terms = [t for t, _ in top]
 
     # Generic document structure tokens
     structure = ["results", "findings", "discussion", "conclusion"]
 
-    # Dedup while preserving order
-    seen: Set[str] = set()
-    final: List[str] = []
-    for t in (terms + list(cues) + structure):
-        t = (t or "").strip()
-        if not t or t in seen:
-            continue
-        seen.add(t)
-        final.append(t)
-
+    # Dedup while preserving order (terms, cues and structure words are all non-empty, unpadded)
+    final = dict.fromkeys(chain(terms, cues, structure))
     return " " + " ".join(final) if final else ""
 
 
@@ -170,12 +224,21 @@ def rag_search_2pass(query: str, k1: int = DEFAULT_K1, k2: int = DEFAULT_K2) ->
     Pass 2: recall (expanded using tokens/cues extracted from Pass 1 evidence)
     Merge + dedupe, then format.
     """
-    hits1 = _store.search(query, k=k1) or []
+    hits1 = _store.search_with_vec(_store.embed(query), k=k1) or []
+    return _second_pass(query, hits1, k1, k2)
+
+
+def _second_pass(query: str, hits1: List[Dict[str, Any]], k1: int, k2: int) -> str:
+    # Pass 2 + merge/format, given the pass-1 hits
+    if HIGH_CONF and len(hits1) >= k1 and hits1[0]["score"] >= HIGH_CONF:
+        # Pass 1 is already confident; a second embed + search would add little
+        return _format_hits(hits1)
+
     expansion = _build_expansion_from_hits(hits1)
-    hits2 = _store.search(query + expansion, k=k2) or []
+    hits2 = _store.search_with_vec(_store.embed(query + expansion), k=k2) or []
 
     merged: List[Dict[str, Any]] = []
-    seen: Set[Tuple[str, Any, Any]] = set()
+    seen: Set[Any] = set()
 
     for h in hits1:
         key = _dedupe_key(h)
@@ -197,6 +260,53 @@ def rag_search_2pass(query: str, k1: int = DEFAULT_K1, k2: int = DEFAULT_K2) ->
     return _format_hits(merged)
 
 
+# -----------------------
+# Raced retrieval (agent default)
+# -----------------------
+
+def _discard_result(task: "asyncio.Future") -> None:
+    # Retrieve an abandoned task's exception so asyncio doesn't log it as never retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+async def rag_search_race(query: str) -> str:
+    """
+    Single-pass retrieval with a time-boxed upgrade to 2-pass.
+    Single-pass and pass 1 search the same query, so one search serves both;
+    pass 2 then gets RACE_TIMEOUT seconds, after which the single-pass
+    evidence is returned instead.
+
+    A pass 2 that loses the race is left to finish on its worker thread
+    (threads can't be cancelled); this is intentional. Its query embeddings
+    still land in the store's cache, but until it finishes it holds the
+    encoder lock, so the next tool call may wait for it.
+    """
+    hits = await asyncio.to_thread(_store.search, query, max(DEFAULT_K, DEFAULT_K1))
+    full = asyncio.ensure_future(
+        asyncio.to_thread(_second_pass, query, hits[:DEFAULT_K1], DEFAULT_K1, DEFAULT_K2)
+    )
+    full.add_done_callback(_discard_result)
+    fast = _format_hits(hits[:DEFAULT_K]) if hits else "NO_HITS"
+
+    try:
+        evidence = await asyncio.wait_for(asyncio.shield(full), timeout=RACE_TIMEOUT)
+        if evidence != "NO_HITS":
+            return evidence
+    except asyncio.TimeoutError:
+        pass
+    except Exception:
+        pass  # fall back to the single-pass result below
+
+    if fast != "NO_HITS":
+        return fast
+    # No single-pass hits: pass 2's broader query is the only remaining chance
+    try:
+        return await full
+    except Exception:
+        return "NO_HITS"
+
+
 # -----------------------
 # Deterministic page fetch (fallback for tables/figures/pages)
 # -----------------------
@@ -219,20 +329,15 @@ def rag_get_page(
     out: List[str] = []
     total = 0
 
-    # records loaded inside LocalRAGStore
-    for r in _store.records:
-        if r.get("source_path") != source_path:
-            continue
-        if r.get("page") != page:
-            continue
-
+    for i in _store.page_record_ids(source_path, page):
+        r = _store.records[i]
         ci = r.get("chunk_index")
         header = f"[{source_path} p.{page}"
         if ci is not None:
             header += f" c.{ci}"
         header += "]"
 
-        txt = (r.get("text") or "").strip().replace("\r\n", "\n")
+        txt = r.get("text") or ""
         if not txt:
             continue
         txt = txt[:max_per_chunk]
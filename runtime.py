@@ -0,0 +1,31 @@
+# runtime.py
+"""
+Process-wide ADK runtime objects (session service + runners).
+
+Memoized so every entry point in the same process shares one session
+service and one Runner per (agent, app). ADK imports are deferred to
+first use to keep CLI startup light.
+"""
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def get_session_service():
+    from google.adk.sessions import InMemorySessionService
+
+    return InMemorySessionService()
+
+
+def _build_agent(agent_key: str):
+    if agent_key == "research":
+        from agents.research_agent import build_research_agent
+
+        return build_research_agent()
+    raise ValueError(f"Unknown agent: {agent_key!r}")
+
+
+@lru_cache(maxsize=4)
+def get_runner(agent_key: str, app_name: str):
+    from google.adk.runners import Runner
+
+    return Runner(agent=_build_agent(agent_key), app_name=app_name, session_service=get_session_service())
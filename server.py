@@ -1,17 +1,25 @@
 # server.py
+import asyncio
 import os
-import re
 import uuid
 from pathlib import Path
 
 from dotenv import load_dotenv
 load_dotenv()
 
+# Split the cores between worker processes (uvicorn/gunicorn read WEB_CONCURRENCY)
+# so BLAS/OpenMP/torch pools don't oversubscribe them. Must run before numpy,
+# faiss or torch are imported; explicit env / .env values win.
+_THREADS = str(max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", "1") or 1))))
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, _THREADS)
+
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from rag.tool import rag_search_2pass, rag_get_page
+from rag.qcache import ExactCache, SemanticCache
+from rag.tool import EMBED_DIM, embed_query, rag_search_2pass, rag_get_page
 from llm.openai_client import openai_chat
 from llm.gemini_client import gemini_chat
 from prompts.research_prompt import build_chat_prompt, DEFAULT_CONFIG
@@ -31,6 +39,14 @@ if DEFAULT_PROVIDER not in _ALLOWED_PROVIDERS:
 # Session memory store (Option B)
 CHAT_STORE = InMemoryChatStore(ttl_seconds=6 * 60 * 60)
 
+# Opt-in: reuse evidence for near-identical retrieval queries (cosine >= SEMANTIC_CACHE_TAU).
+# 0 (default) disables it; the retrieval query includes the session summary, so
+# consecutive turns are textually close and a threshold must be tuned per corpus/model.
+SEMANTIC_CACHE_TAU = float(os.getenv("SEMANTIC_CACHE_TAU", "0") or 0)
+EVIDENCE_CACHE = SemanticCache(dim=EMBED_DIM, tau=SEMANTIC_CACHE_TAU, ttl=300)
+# Evidence for the exact same retrieval query (checked first: no embedding needed)
+EXACT_EVIDENCE_CACHE = ExactCache(capacity=2048, ttl=300)
+
 app = FastAPI()
 app.mount("/web", StaticFiles(directory=str(WEB_DIR)), name="web")
 
@@ -49,19 +65,28 @@ def _extract_sources_from_evidence(evidence: str) -> list[str]:
       [paper.pdf p.4 c.12]
     Capture: "paper.pdf p.4"
     """
-    sources = []
-    for m in re.finditer(r"\[([^\]]+)\]", evidence or ""):
-        hdr = m.group(1)  # e.g. "JAAD.pdf p.4 c.0"
-        # keep file + page only
-        parts = hdr.split()
-        if not parts:
+    sources: list[str] = []
+    seen: set[str] = set()
+    text = evidence or ""
+    i = text.find("[")
+    while i != -1 and len(sources) < 8:
+        end = text.find("]", i + 1)
+        if end == -1:
+            break
+        if end == i + 1:
+            # "[]" is not a header; the next one may start right after it
+            i = text.find("[", i + 1)
             continue
-        file_part = parts[0]
-        page_part = next((p for p in parts[1:] if p.startswith("p.")), "")
-        s = (file_part + (" " + page_part if page_part else "")).strip()
-        if s and s not in sources:
-            sources.append(s)
-    return sources[:8]
+        # keep file + page only, e.g. "JAAD.pdf p.4 c.0" -> "JAAD.pdf p.4"
+        parts = text[i + 1 : end].split()
+        if parts:
+            page_part = next((p for p in parts[1:] if p.startswith("p.")), "")
+            src = parts[0] + (" " + page_part if page_part else "")
+            if src not in seen:
+                seen.add(src)
+                sources.append(src)
+        i = text.find("[", end + 1)
+    return sources
 
 
 @app.get("/health")
@@ -108,10 +133,14 @@ async def chat(request: Request):
     if mode == "get_page":
         source_path = (body.get("source_path") or "").strip()
         page = body.get("page")
+        if isinstance(page, str) and page.strip().isdigit():
+            page = int(page)
         if not source_path or page is None:
             raise HTTPException(status_code=400, detail="mode=get_page requires source_path and page")
+        if not isinstance(page, int) or isinstance(page, bool):
+            raise HTTPException(status_code=400, detail="page must be an integer")
 
-        evidence = rag_get_page(source_path=source_path, page=page)
+        evidence = await asyncio.to_thread(rag_get_page, source_path=source_path, page=page)
         if evidence == "NO_HITS":
             return JSONResponse(
                 {"answer": "I couldn’t find that page in the indexed documents.", "provider": provider, "session_id": session_id}
@@ -121,7 +150,18 @@ async def chat(request: Request):
         ctx_hint = state.summary.strip()
         # keep it short to avoid poisoning retrieval
         query_for_retrieval = user_msg if not ctx_hint else f"{user_msg}\nContext hint: {ctx_hint}"
-        evidence = rag_search_2pass(query_for_retrieval)
+        # Retrieval and LLM calls are blocking; run them in worker threads so the
+        # event loop keeps serving other requests (session state stays on the loop)
+        evidence = EXACT_EVIDENCE_CACHE.get(query_for_retrieval)
+        if evidence is None:
+            qv = await asyncio.to_thread(embed_query, query_for_retrieval) if SEMANTIC_CACHE_TAU else None
+            evidence = EVIDENCE_CACHE.get(qv) if qv is not None else None
+            if evidence is None:
+                evidence = await asyncio.to_thread(rag_search_2pass, query_for_retrieval)
+                if qv is not None and evidence != "NO_HITS":
+                    EVIDENCE_CACHE.put(qv, evidence)
+            if evidence != "NO_HITS":
+                EXACT_EVIDENCE_CACHE.put(query_for_retrieval, evidence)
         if evidence == "NO_HITS":
             return JSONResponse(
                 {"answer": "I couldn’t find relevant evidence in the indexed documents.", "provider": provider, "session_id": session_id}
@@ -137,10 +177,8 @@ async def chat(request: Request):
 
     # Generation
     try:
-        if provider == "gemini":
-            answer = gemini_chat(prompt)
-        else:
-            answer = openai_chat(prompt)
+        llm_chat = gemini_chat if provider == "gemini" else openai_chat
+        answer = await asyncio.to_thread(llm_chat, prompt)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"LLM call failed: {e}")
 